@@ -3,81 +3,320 @@ APK Editor - Core APK processing functionality
 Handles decompilation, compilation, and signing of APK files
 """
 
+import collections
+import concurrent.futures
+import copy
+import datetime
+import functools
+import io
+import mmap
+import multiprocessing
 import os
+import struct
 import subprocess
 import shutil
+import threading
+import time
 import zipfile
 import logging
 from pathlib import Path
 
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.serialization import pkcs12
+    from cryptography.x509.oid import NameOID
+except ImportError:
+    # Optional: without it the debug keystore is created with keytool
+    x509 = None
+
+try:
+    from isal import isal_zlib as fast_zlib
+except ImportError:
+    try:
+        from zlib_ng import zlib_ng as fast_zlib
+    except ImportError:
+        # Optional: zipfile keeps using the stdlib zlib
+        fast_zlib = None
+
+if fast_zlib is not None:
+    # Route zipfile's DEFLATE, INFLATE and CRC-32 through ISA-L's (levels 0-3 only)
+    # or zlib-ng's SIMD code; both are drop-in zlib modules
+    zipfile.zlib = fast_zlib
+    zipfile.crc32 = fast_zlib.crc32
+
+# Chunk size used when streaming archive entries to and from disk
+COPY_BUFFER_SIZE = 1 << 20
+
+# Seconds an external command may run without printing any output before it is killed
+COMMAND_IDLE_TIMEOUT = 300
+
+# Archives with more entries than this are extracted by a thread pool
+PARALLEL_EXTRACT_THRESHOLD = 64
+
+# Threads used by remove_tree to unlink files
+REMOVE_WORKERS = 32
+
+# Entries written without recompression when rebuilding an APK
+STORED_EXTS = frozenset((
+    '.png', '.jpg', '.jpeg', '.webp', '.gif', '.mp3', '.mp4', '.ogg', '.m4a',
+    '.arsc', '.so', '.dex'
+))
+
+# Per-thread scratch buffer reused across entries by _copy_stream
+_BUF = threading.local()
+
+
+def _copy_stream(src, dst):
+    """Copy src to dst through a reusable 1 MiB buffer"""
+    buf = getattr(_BUF, 'buf', None)
+    if buf is None:
+        buf = _BUF.buf = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = src.readinto(view)
+        if not n:
+            break
+        dst.write(view[:n])
+
+
+def open_buffered_writer(path):
+    """Open path for writing behind a 1 MiB write buffer"""
+    return io.BufferedWriter(open(path, 'wb', buffering=0), buffer_size=COPY_BUFFER_SIZE)
+
+
+def _begin_raw_entry(zip_ref, zinfo):
+    """Write the local header for an entry whose compressed data follows verbatim"""
+    # Sizes and CRC are known up front, so no trailing data descriptor is needed
+    zinfo.flag_bits &= ~0x08
+    zinfo.header_offset = zip_ref.fp.tell()
+    zip_ref.fp.write(zinfo.FileHeader())
+
+
+def _finish_raw_entry(zip_ref, zinfo):
+    """Register an entry written by _begin_raw_entry in the central directory"""
+    # ZipFile has no public raw-write API; this mirrors what write() records
+    zip_ref.filelist.append(zinfo)
+    zip_ref.NameToInfo[zinfo.filename] = zinfo
+    zip_ref.start_dir = zip_ref.fp.tell()
+    zip_ref._didModify = True
+
+
+def write_precompressed(zip_ref, zinfo, data):
+    """Append already-compressed data to zip_ref
+
+    zinfo must carry compress_type, CRC, file_size and compress_size for data.
+    """
+    _begin_raw_entry(zip_ref, zinfo)
+    zip_ref.fp.write(data)
+    _finish_raw_entry(zip_ref, zinfo)
+
+
+def zipinfo_from_stat(st, arcname):
+    """ZipInfo.from_file() for a file whose os.stat() result is already known"""
+    if os.sep != '/':
+        arcname = arcname.replace(os.sep, '/')
+    zinfo = zipfile.ZipInfo(arcname, time.localtime(st.st_mtime)[:6])
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    zinfo.file_size = st.st_size
+    return zinfo
+
+
+def deflate_bytes(data, level=1):
+    """Raw-DEFLATE data for a ZIP entry; returns (crc32, size, compressed bytes)"""
+    compressor = zipfile.zlib.compressobj(level, zipfile.zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    return zipfile.crc32(data), len(data), compressed
+
+
+def deflate_file(path, level=1):
+    """Raw-DEFLATE a file for a ZIP entry; returns (crc32, size, compressed bytes)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= COPY_BUFFER_SIZE:
+            return deflate_bytes(f.read(), level)
+        # Compress large files straight from the page cache instead of a bytes copy
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return deflate_bytes(mm, level)
+
+
+@functools.lru_cache(maxsize=1)
+def deflate_pool():
+    """Process pool shared by exports that deflate many files"""
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=context)
+
+
+def _entry_mtime(info):
+    """Return a ZipInfo's local date_time as a POSIX timestamp, or None if it is no real date"""
+    year, month, day = info.date_time[:3]
+    # Zeroed DOS dates read as (1980, 0, 0); mktime() would turn them into 1979
+    if year < 1980 or not 1 <= month <= 12 or not 1 <= day <= 31:
+        return None
+    return time.mktime(info.date_time + (0, 0, -1))
+
+
+def _cd_has_name(cd, name, suffix=False):
+    """Check raw central directory bytes for an entry named name (or ending with it)"""
+    i = cd.find(name)
+    while i >= 0:
+        start = cd.rfind(b'PK\x01\x02', 0, i)
+        if start >= 0:
+            name_start = start + 46
+            name_len = struct.unpack_from('<H', cd, start + 28)[0]
+            if name_start + name_len == i + len(name) and (suffix or name_start == i):
+                return True
+        i = cd.find(name, i + 1)
+    return False
+
+
+def stat_safe(path):
+    """Return os.stat(path), or None if it cannot be stat'ed"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def iter_files(root):
+    """Yield a DirEntry for every file under root, without an extra stat per entry"""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry
+
+
+def _unlink_quiet(path):
+    """Unlink path, ignoring files that are already gone"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_tree(root):
+    """Delete a directory tree, unlinking its files from a thread pool"""
+    files = []
+    dirs = []
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        with os.scandir(d) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    dirs.append(entry.path)
+                else:
+                    files.append(entry.path)
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=REMOVE_WORKERS) as ex:
+        list(ex.map(_unlink_quiet, files))
+    
+    # Children sort after their parents, so reverse order removes the deepest first
+    for d in sorted(dirs, reverse=True):
+        try:
+            os.rmdir(d)
+        except FileNotFoundError:
+            pass
+    os.rmdir(root)
+
+
+@functools.lru_cache(maxsize=1)
+def _find_apktool():
+    """Find APKTool executable"""
+    # Check common locations
+    possible_paths = [
+        'apktool.jar',
+        'tools/apktool.jar',
+        os.path.expanduser('~/apktool.jar'),
+        '/usr/local/bin/apktool.jar'
+    ]
+    
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+    
+    # Try to find in PATH
+    return shutil.which('apktool')
+
+
+@functools.lru_cache(maxsize=1)
+def _find_java():
+    """Find Java executable"""
+    return 'java' if shutil.which('java') else None
+
+
 class APKEditor:
     """Main class for APK editing operations"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.apktool_path = self._find_apktool()
-        self.java_path = self._find_java()
-        
-    def _find_apktool(self):
-        """Find APKTool executable"""
-        # Check common locations
-        possible_paths = [
-            'apktool.jar',
-            'tools/apktool.jar',
-            os.path.expanduser('~/apktool.jar'),
-            '/usr/local/bin/apktool.jar'
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                return path
-        
-        # Try to find in PATH
-        try:
-            result = subprocess.run(['which', 'apktool'], capture_output=True, text=True)
-            if result.returncode == 0:
-                return result.stdout.strip()
-        except:
-            pass
-            
-        return None
-    
-    def _find_java(self):
-        """Find Java executable"""
-        try:
-            result = subprocess.run(['java', '-version'], capture_output=True, text=True)
-            if result.returncode == 0:
-                return 'java'
-        except:
-            pass
-        
-        return None
+        self.apktool_path = _find_apktool()
+        self.java_path = _find_java()
     
     def _run_command(self, command, cwd=None):
         """Run system command and return success status"""
         try:
             self.logger.info(f"Running command: {' '.join(command)}")
-            result = subprocess.run(
+            proc = subprocess.Popen(
                 command,
                 cwd=cwd,
-                capture_output=True,
+                # apktool logs progress to stdout; every line counts as activity
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=1,
                 text=True,
-                timeout=300  # 5 minutes timeout
+                errors='replace'
             )
-            
-            if result.returncode == 0:
-                self.logger.info("Command executed successfully")
-                return True
-            else:
-                self.logger.error(f"Command failed: {result.stderr}")
-                return False
-                
-        except subprocess.TimeoutExpired:
-            self.logger.error("Command timed out")
+        except Exception as e:
+            self.logger.error(f"Error running command: {e}")
             return False
+        
+        # Kill the process only once it has been silent for COMMAND_IDLE_TIMEOUT
+        last_activity = time.monotonic()
+        finished = threading.Event()
+        timed_out = threading.Event()
+        
+        def watchdog():
+            while not finished.wait(1):
+                if time.monotonic() - last_activity > COMMAND_IDLE_TIMEOUT:
+                    timed_out.set()
+                    proc.kill()
+                    return
+        
+        threading.Thread(target=watchdog, daemon=True).start()
+        tail = collections.deque(maxlen=50)
+        
+        try:
+            for line in proc.stdout:
+                line = line.rstrip()
+                last_activity = time.monotonic()
+                if line:
+                    tail.append(line)
+                    self.logger.info(line)
+            returncode = proc.wait()
         except Exception as e:
+            proc.kill()
+            proc.wait()
             self.logger.error(f"Error running command: {e}")
             return False
+        finally:
+            finished.set()
+            proc.stdout.close()
+        
+        if timed_out.is_set():
+            self.logger.error("Command timed out")
+            return False
+        if returncode == 0:
+            self.logger.info("Command executed successfully")
+            return True
+        self.logger.error("Command failed: " + "\n".join(tail))
+        return False
     
     def decompile_apk(self, apk_path, output_dir):
         """Decompile APK file"""
@@ -103,7 +342,34 @@ class APKEditor:
         """Extract APK file as a ZIP archive (fallback method)"""
         try:
             with zipfile.ZipFile(apk_path, 'r') as zip_ref:
-                zip_ref.extractall(output_dir)
+                entries = []
+                parents = set()
+                for info in zip_ref.infolist():
+                    target = self._entry_target(output_dir, info.filename)
+                    if target is None:
+                        self.logger.warning(f"Skipping unsafe entry: {info.filename}")
+                        continue
+                    if info.is_dir():
+                        parents.add(target)
+                        continue
+                    parents.add(os.path.dirname(target))
+                    entries.append((info, target))
+                
+                # Create every containing directory once up front
+                for parent in parents:
+                    os.makedirs(parent, exist_ok=True)
+                
+                if len(entries) <= PARALLEL_EXTRACT_THRESHOLD:
+                    self._extract_entries(zip_ref, entries)
+            
+            if len(entries) > PARALLEL_EXTRACT_THRESHOLD:
+                # ZipFile handles are not thread-safe, so each worker opens its own
+                workers = min(os.cpu_count() or 1, len(entries))
+                slices = [entries[i::workers] for i in range(workers)]
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+                    futures = [ex.submit(self._extract_slice, apk_path, chunk) for chunk in slices]
+                    for future in futures:
+                        future.result()
             
             self.logger.info("APK extracted as ZIP (simulation mode)")
             return True
@@ -112,7 +378,30 @@ class APKEditor:
             self.logger.error(f"Error extracting APK: {e}")
             return False
     
-    def compile_apk(self, project_dir, output_path):
+    def _extract_slice(self, apk_path, entries):
+        """Extract a subset of entries through a private ZipFile handle"""
+        with zipfile.ZipFile(apk_path, 'r') as zip_ref:
+            self._extract_entries(zip_ref, entries)
+    
+    def _extract_entries(self, zip_ref, entries):
+        """Write (info, target) entries from zip_ref to disk"""
+        for info, target in entries:
+            with zip_ref.open(info, 'r') as src, open_buffered_writer(target) as dst:
+                _copy_stream(src, dst)
+            # Keep the archive timestamp so compile can spot untouched files; entries
+            # without a real date keep the extraction time and are rewritten on compile
+            mtime = _entry_mtime(info)
+            if mtime is not None:
+                os.utime(target, (mtime, mtime))
+    
+    def _entry_target(self, output_dir, name):
+        """Resolve an archive entry name to a path inside output_dir, or None if it escapes"""
+        parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.', '..')]
+        if not parts:
+            return None
+        return os.path.join(output_dir, *parts)
+    
+    def compile_apk(self, project_dir, output_path, original_apk=None):
         """Compile APK from project directory"""
         if not os.path.exists(project_dir):
             self.logger.error(f"Project directory not found: {project_dir}")
@@ -135,17 +424,24 @@ class APKEditor:
             return False
         else:
             # Fallback: Create ZIP file
-            return self._create_apk_as_zip(project_dir, output_path)
+            return self._create_apk_as_zip(project_dir, output_path, original_apk)
     
-    def _create_apk_as_zip(self, project_dir, output_path):
+    def _create_apk_as_zip(self, project_dir, output_path, original_apk=None):
         """Create APK file as ZIP (fallback method)"""
         try:
-            with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
-                for root, dirs, files in os.walk(project_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arc_path = os.path.relpath(file_path, project_dir)
-                        zip_ref.write(file_path, arc_path)
+            with open_buffered_writer(output_path) as out, \
+                    zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+                copied = set()
+                if original_apk and os.path.exists(original_apk):
+                    copied = self._copy_unchanged_entries(original_apk, project_dir, zip_ref)
+                
+                for entry in iter_files(project_dir):
+                    if entry.path in copied:
+                        continue
+                    arc_path = os.path.relpath(entry.path, project_dir)
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    compress_type = zipfile.ZIP_STORED if ext in STORED_EXTS else zipfile.ZIP_DEFLATED
+                    zip_ref.write(entry.path, arc_path, compress_type=compress_type)
             
             self.logger.info("APK created as ZIP (simulation mode)")
             return True
@@ -154,11 +450,59 @@ class APKEditor:
             self.logger.error(f"Error creating APK: {e}")
             return False
     
+    def _copy_unchanged_entries(self, original_apk, project_dir, zip_ref):
+        """Copy entries whose extracted file is untouched straight from the original APK
+        
+        The compressed bytes and CRC-32 are reused as-is, so nothing is inflated or
+        deflated. Returns the set of project file paths that were copied.
+        """
+        copied = set()
+        with zipfile.ZipFile(original_apk, 'r') as orig, open(original_apk, 'rb') as src:
+            for info in orig.infolist():
+                if info.is_dir() or info.flag_bits & 0x01:
+                    continue
+                path = self._entry_target(project_dir, info.filename)
+                if path is None:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if st.st_size != info.file_size or time.localtime(st.st_mtime)[:6] != info.date_time:
+                    continue
+                
+                self._write_raw_entry(zip_ref, src, info)
+                copied.add(path)
+        
+        return copied
+    
+    def _write_raw_entry(self, zip_ref, src, info):
+        """Append info's compressed data from the src file object to zip_ref"""
+        src.seek(info.header_offset)
+        header = src.read(30)
+        if header[:4] != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+        name_len, extra_len = struct.unpack('<HH', header[26:30])
+        src.seek(info.header_offset + 30 + name_len + extra_len)
+        
+        zinfo = copy.copy(info)
+        _begin_raw_entry(zip_ref, zinfo)
+        
+        remaining = info.compress_size
+        while remaining:
+            chunk = src.read(min(remaining, COPY_BUFFER_SIZE))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated data for {info.filename}")
+            zip_ref.fp.write(chunk)
+            remaining -= len(chunk)
+        
+        _finish_raw_entry(zip_ref, zinfo)
+    
     def _sign_apk(self, apk_path):
         """Sign APK with debug keystore"""
         try:
             # Create debug keystore if it doesn't exist
-            keystore_path = self._create_debug_keystore()
+            keystore_path = self.ensure_debug_keystore()
             
             if not keystore_path:
                 self.logger.warning("Could not create keystore, APK will be unsigned")
@@ -178,13 +522,21 @@ class APKEditor:
             self.logger.error(f"Error signing APK: {e}")
             return True  # Continue without signing
     
-    def _create_debug_keystore(self):
+    def ensure_debug_keystore(self):
         """Create debug keystore for signing"""
         keystore_path = 'debug.keystore'
         
         if os.path.exists(keystore_path):
             return keystore_path
         
+        # Generate in-process when possible; keytool costs a JVM start
+        if x509 is not None:
+            try:
+                self._generate_debug_keystore(keystore_path)
+                return keystore_path
+            except Exception as e:
+                self.logger.warning(f"Could not generate keystore in Python, trying keytool: {e}")
+        
         try:
             command = [
                 'keytool', '-genkey', '-v', '-keystore', keystore_path,
@@ -202,31 +554,85 @@ class APKEditor:
         
         return None
     
+    def _generate_debug_keystore(self, keystore_path):
+        """Write a PKCS#12 debug keystore equivalent to the keytool one"""
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, 'Android Debug'),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'Android'),
+            x509.NameAttribute(NameOID.COUNTRY_NAME, 'US'),
+        ])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=10000))
+            .sign(key, hashes.SHA256())
+        )
+        data = pkcs12.serialize_key_and_certificates(
+            name=b'androiddebugkey',
+            key=key,
+            cert=cert,
+            cas=None,
+            encryption_algorithm=serialization.BestAvailableEncryption(b'android')
+        )
+        
+        with open(keystore_path, 'wb') as f:
+            f.write(data)
+        self.logger.info("Generated debug keystore")
+    
     def get_apk_info(self, apk_path):
         """Get APK information"""
+        st = stat_safe(apk_path)
         info = {
             'filename': os.path.basename(apk_path),
-            'size': os.path.getsize(apk_path) if os.path.exists(apk_path) else 0,
+            'size': st.st_size if st else 0,
             'valid': False
         }
         
         try:
-            # Check if it's a valid ZIP file
-            with zipfile.ZipFile(apk_path, 'r') as zip_ref:
-                files = zip_ref.namelist()
+            # Read the end-of-central-directory record straight out of a read-only map
+            with open(apk_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                eocd = mm.rfind(b'PK\x05\x06', max(0, len(mm) - 65557))
+                if eocd < 0:
+                    raise zipfile.BadZipFile("End of central directory not found")
+                count, cd_size, cd_offset = struct.unpack_from('<HII', mm, eocd + 10)
+                
+                if count == 0xFFFF or cd_offset == 0xFFFFFFFF:
+                    # ZIP64 archive: let zipfile parse it
+                    return self._get_apk_info_zipfile(apk_path, info)
                 
                 # Check for essential APK files
-                has_manifest = 'AndroidManifest.xml' in files
-                has_dex = any(f.endswith('.dex') for f in files)
+                cd = mm[cd_offset:cd_offset + cd_size]
+                has_manifest = _cd_has_name(cd, b'AndroidManifest.xml')
+                has_dex = _cd_has_name(cd, b'.dex', suffix=True)
                 
                 info['valid'] = has_manifest and has_dex
-                info['files_count'] = len(files)
+                info['files_count'] = count
                 
         except Exception as e:
             self.logger.error(f"Error reading APK info: {e}")
         
         return info
     
+    def _get_apk_info_zipfile(self, apk_path, info):
+        """Fill in APK information by parsing the archive with zipfile"""
+        with zipfile.ZipFile(apk_path, 'r') as zip_ref:
+            files = zip_ref.namelist()
+            
+            # Check for essential APK files
+            has_manifest = 'AndroidManifest.xml' in files
+            has_dex = any(f.endswith('.dex') for f in files)
+            
+            info['valid'] = has_manifest and has_dex
+            info['files_count'] = len(files)
+        
+        return info
+    
     def is_ready(self):
         """Check if APK Editor is ready to use"""
         return {
@@ -3,391 +3,103 @@ APK Editor Flask Application
 Main application factory and route definitions
 """
 
+import collections
+import concurrent.futures
+import functools
+import mmap
 import os
+import re
 import shutil
+import tempfile
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
 import zipfile
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from urllib.parse import quote
 from werkzeug.utils import secure_filename
-from flask import Flask, request, render_template, redirect, url_for, flash, jsonify, send_file
+from flask import Flask, Request, current_app, request, render_template, redirect, url_for, flash, jsonify, send_file
 from flask_sqlalchemy import SQLAlchemy
-from apk_editor import APKEditor
+from sqlalchemy import event, select
+from apk_editor import (APKEditor, COPY_BUFFER_SIZE, deflate_bytes, deflate_file, deflate_pool, iter_files,
+                        open_buffered_writer, remove_tree, stat_safe, write_precompressed,
+                        zipinfo_from_stat)
 import logging
 
 # Initialize database
 db = SQLAlchemy()
 
-class Project(db.Model):
-    """Database model for APK projects"""
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    original_filename = db.Column(db.String(200), nullable=False)
-    status = db.Column(db.String(50), default='uploaded')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    path = db.Column(db.String(500))
+# Shared APK Editor; tool discovery runs once per process
+apk_editor = APKEditor()
 
-def create_app():
-    """Application factory"""
-    app = Flask(__name__)
-    
-    # Configuration
-    app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///apk_editor.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
-    app.config['UPLOAD_FOLDER'] = 'uploads'
-    
-    # Initialize extensions
-    db.init_app(app)
-    
-    # Setup logging
-    logging.basicConfig(level=logging.INFO)
-    
-    # Create directories
-    os.makedirs('uploads', exist_ok=True)
-    os.makedirs('projects', exist_ok=True)
-    os.makedirs('temp', exist_ok=True)
-    os.makedirs('static', exist_ok=True)
-    os.makedirs('templates', exist_ok=True)
-    
-    # Initialize APK Editor
-    apk_editor = APKEditor()
-    
-    @app.cli.command("init-db")
-    def init_db_command():
-        """Creates the database tables."""
-        db.create_all()
-        print("Initialized the database.")
-    
-    @app.route('/')
-    def index():
-        """Main page"""
-        projects = Project.query.order_by(Project.created_at.desc()).all()
-        return render_template('index.html', projects=projects)
-    
-    @app.route('/upload', methods=['GET', 'POST'])
-    def upload_apk():
-        """Upload APK file"""
-        if request.method == 'POST':
-            if 'apk_file' not in request.files:
-                flash('No file selected', 'error')
-                return redirect(request.url)
-            
-            file = request.files['apk_file']
-            project_name = request.form.get('project_name', '').strip()
-            
-            if file.filename == '':
-                flash('No file selected', 'error')
-                return redirect(request.url)
-            
-            if not project_name:
-                project_name = os.path.splitext(file.filename)[0]
-            
-            if file and file.filename.lower().endswith('.apk'):
-                try:
-                    # Save uploaded file
-                    filename = secure_filename(file.filename)
-                    upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(upload_path)
-                    
-                    # Create project
-                    project = Project(
-                        name=project_name,
-                        original_filename=filename,
-                        status='uploaded',
-                        path=upload_path
-                    )
-                    db.session.add(project)
-                    db.session.commit()
-                    
-                    flash(f'APK uploaded successfully: {project_name}', 'success')
-                    return redirect(url_for('project_detail', project_id=project.id))
-                    
-                except Exception as e:
-                    flash(f'Error uploading file: {str(e)}', 'error')
-            else:
-                flash('Please select a valid APK file', 'error')
-        
-        return render_template('upload.html')
-    
-    @app.route('/project/<int:project_id>')
-    def project_detail(project_id):
-        """Project detail page"""
-        project = Project.query.get_or_404(project_id)
-        
-        # Get project directory structure if decompiled
-        project_dir = os.path.join('projects', f'project_{project_id}')
-        files = []
-        
-        if os.path.exists(project_dir):
-            for root, dirs, filenames in os.walk(project_dir):
-                for filename in filenames:
-                    if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.xml')):
-                        file_path = os.path.join(root, filename)
-                        rel_path = os.path.relpath(file_path, project_dir)
-                        files.append({
-                            'name': filename,
-                            'path': rel_path,
-                            'type': get_file_type(filename)
-                        })
-        
-        return render_template('project_detail.html', project=project, files=files)
-    
-    @app.route('/decompile/<int:project_id>')
-    def decompile_apk(project_id):
-        """Decompile APK"""
-        project = Project.query.get_or_404(project_id)
-        
-        try:
-            project_dir = os.path.join('projects', f'project_{project_id}')
-            success = apk_editor.decompile_apk(project.path, project_dir)
-            
-            if success:
-                project.status = 'decompiled'
-                db.session.commit()
-                flash('APK decompiled successfully', 'success')
-            else:
-                flash('Failed to decompile APK', 'error')
-                
-        except Exception as e:
-            flash(f'Error decompiling APK: {str(e)}', 'error')
-        
-        return redirect(url_for('project_detail', project_id=project_id))
-    
-    @app.route('/compile/<int:project_id>')
-    def compile_apk(project_id):
-        """Compile APK"""
-        project = Project.query.get_or_404(project_id)
-        
-        try:
-            project_dir = os.path.join('projects', f'project_{project_id}')
-            output_path = os.path.join('temp', f'{project.name}_modified.apk')
-            
-            success = apk_editor.compile_apk(project_dir, output_path)
-            
-            if success:
-                project.status = 'compiled'
-                project.path = output_path
-                db.session.commit()
-                flash('APK compiled successfully', 'success')
-            else:
-                flash('Failed to compile APK', 'error')
-                
-        except Exception as e:
-            flash(f'Error compiling APK: {str(e)}', 'error')
-        
-        return redirect(url_for('project_detail', project_id=project_id))
-    
-    @app.route('/download/<int:project_id>')
-    def download_apk(project_id):
-        """Download compiled APK"""
-        project = Project.query.get_or_404(project_id)
-        
-        if project.status != 'compiled' or not os.path.exists(project.path):
-            flash('APK not ready for download. Please compile first.', 'error')
-            return redirect(url_for('project_detail', project_id=project_id))
-        
-        return send_file(project.path, as_attachment=True, 
-                        download_name=f'{project.name}_modified.apk')
-    
-    @app.route('/export_android_studio/<int:project_id>')
-    def export_android_studio(project_id):
-        """Export project for Android Studio"""
-        project = Project.query.get_or_404(project_id)
-        project_dir = os.path.join('projects', f'project_{project_id}')
-        
-        if not os.path.exists(project_dir):
-            flash('Project not decompiled yet. Please decompile first.', 'error')
-            return redirect(url_for('project_detail', project_id=project_id))
-        
-        try:
-            # Create export ZIP
-            export_path = os.path.join('temp', f'{project.name}_android_studio.zip')
-            success = create_android_studio_export(project_dir, export_path, project.name)
-            
-            if success:
-                return send_file(export_path, as_attachment=True,
-                               download_name=f'{project.name}_android_studio.zip')
-            else:
-                flash('Failed to create Android Studio export', 'error')
-                
-        except Exception as e:
-            flash(f'Error creating export: {str(e)}', 'error')
-        
-        return redirect(url_for('project_detail', project_id=project_id))
-    
-    @app.route('/edit_file/<int:project_id>/<path:file_path>')
-    def edit_file(project_id, file_path):
-        """Edit file in project"""
-        project = Project.query.get_or_404(project_id)
-        project_dir = os.path.join('projects', f'project_{project_id}')
-        full_path = os.path.join(project_dir, file_path)
-        
-        if not os.path.exists(full_path):
-            flash('File not found', 'error')
-            return redirect(url_for('project_detail', project_id=project_id))
-        
-        file_type = get_file_type(file_path)
-        content = None
-        
-        if file_type == 'xml':
-            try:
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            except:
-                with open(full_path, 'r', encoding='latin-1') as f:
-                    content = f.read()
-        
-        return render_template('edit_file.html', project=project, 
-                             file_path=file_path, file_type=file_type, content=content)
-    
-    @app.route('/save_file/<int:project_id>/<path:file_path>', methods=['POST'])
-    def save_file(project_id, file_path):
-        """Save edited file"""
-        project = Project.query.get_or_404(project_id)
-        project_dir = os.path.join('projects', f'project_{project_id}')
-        full_path = os.path.join(project_dir, file_path)
-        
-        content = request.form.get('content', '')
-        
-        try:
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            flash('File saved successfully', 'success')
-        except Exception as e:
-            flash(f'Error saving file: {str(e)}', 'error')
-        
-        return redirect(url_for('project_detail', project_id=project_id))
-    
-    @app.route('/delete_project/<int:project_id>')
-    def delete_project(project_id):
-        """Delete project"""
-        project = Project.query.get_or_404(project_id)
-        
-        try:
-            # Delete project files
-            project_dir = os.path.join('projects', f'project_{project_id}')
-            if os.path.exists(project_dir):
-                shutil.rmtree(project_dir)
-            
-            if os.path.exists(project.path):
-                os.remove(project.path)
-            
-            # Delete from database
-            db.session.delete(project)
-            db.session.commit()
-            
-            flash('Project deleted successfully', 'success')
-        except Exception as e:
-            flash(f'Error deleting project: {str(e)}', 'error')
-        
-        return redirect(url_for('index'))
-    
-    @app.errorhandler(413)
-    def too_large(e):
-        flash('File too large. Maximum size is 100MB.', 'error')
-        return redirect(url_for('upload_apk'))
-    
-    def get_file_type(filename):
-        """Get file type based on extension"""
-        ext = filename.lower().split('.')[-1]
-        if ext in ['png', 'jpg', 'jpeg', 'webp']:
-            return 'image'
-        elif ext == 'xml':
-            return 'xml'
-        else:
-            return 'other'
-    
-    def should_skip_file(file_path):
-        """Check if file should be skipped during Android Studio export"""
-        # Skip problematic 9-patch files that often cause compilation errors
-        if file_path.endswith('.9.png'):
-            return True
-        
-        # Skip binary resource files that may be corrupted
-        if file_path.endswith('.arsc'):
-            return True
-        
-        # Skip dex files (compiled Java bytecode)
-        if file_path.endswith('.dex'):
-            return True
-        
-        # Skip binary kotlin files
-        if file_path.endswith('.kotlin_builtins'):
-            return True
-        
-        # Skip META-INF signing files
-        if 'META-INF/' in file_path and (
-            file_path.endswith('.RSA') or 
-            file_path.endswith('.SF') or 
-            file_path.endswith('.MF')
-        ):
-            return True
-        
-        # Skip certain resource directories that cause issues
-        problematic_dirs = [
-            'drawable-ldrtl-',  # RTL drawable variants
-            'color-v31/',       # Dynamic color resources (Android 12+)
-            'drawable-v31/',    # Android 12+ specific drawables
-            'layout-v31/',      # Android 12+ specific layouts
-            'values-v31/',      # Android 12+ specific values
-            'mipmap-anydpi-v26/', # Adaptive icons that may cause issues
-        ]
-        
-        for prob_dir in problematic_dirs:
-            if prob_dir in file_path:
-                return True
-        
-        # Skip files with problematic names (corrupted during decompilation)
-        if any(char in os.path.basename(file_path) for char in ['?', ':', '<', '>', '|', '"', '*']):
-            return True
-        
-        # Skip very large files that might cause memory issues
-        try:
-            if os.path.exists(file_path) and os.path.getsize(file_path) > 50 * 1024 * 1024:  # 50MB
-                return True
-        except:
-            pass
-        
-        # Validate XML files to prevent prolog errors
-        if file_path.endswith('.xml'):
-            try:
-                import xml.etree.ElementTree as ET
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # Check for empty or invalid XML content
-                    if not content.strip():
-                        return True
-                    # Try to parse XML to validate structure
-                    ET.fromstring(content)
-            except (ET.ParseError, UnicodeDecodeError, FileNotFoundError):
-                # Skip corrupted or unparseable XML files
-                return True
-            except Exception:
-                # Skip any XML file that causes other parsing issues
-                return True
-        
-        return False
-    
-    def create_android_studio_export(project_dir, export_path, project_name):
-        """Create Android Studio compatible project export"""
-        try:
-            with zipfile.ZipFile(export_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
-                # Create Android Studio project structure
-                
-                # Add gradle wrapper properties first
-                gradle_wrapper_properties = """distributionBase=GRADLE_USER_HOME
+# Background pool for decompile/compile jobs; one tracked Future per project id
+job_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(2, os.cpu_count() or 1))
+jobs = {}
+jobs_lock = threading.Lock()
+
+# Status shown while a job runs, mapped to the status restored if the job is lost
+JOB_STATUSES = {'decompiling': 'uploaded', 'compiling': 'decompiled'}
+
+# Copied files deflated in Android Studio exports; everything else is stored
+EXPORT_TEXT_SUFFIXES = ('.xml', '.gradle', '.properties', '.pro', '.md', '.java', '.bat', 'gradlew')
+
+# Export archive codecs selectable with ?compression=; LZMA is smaller but not
+# every unzip tool (e.g. Windows Explorer) can read it, so deflate stays the default
+EXPORT_COMPRESSION = {
+    'deflate': zipfile.ZIP_DEFLATED,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+# Exports with more text files than this deflate them in a process pool
+PARALLEL_DEFLATE_THRESHOLD = 64
+
+# Export files up to this size are read ahead on a thread pool and added with writestr
+SMALL_FILE_LIMIT = 64 * 1024
+EXPORT_READ_WORKERS = 16
+EXPORT_READ_AHEAD = 256
+
+# Leading bytes of Android's compiled (binary) XML format
+AXML_MAGIC = b'\x03\x00\x08\x00'
+
+# Leading bytes of a ZIP local file header; every APK starts with one
+ZIP_MAGIC = b'PK\x03\x04'
+
+# Resource directories left out of Android Studio exports, matched in one scan
+PROBLEMATIC_RES_DIRS = re.compile('|'.join(map(re.escape, (
+    'drawable-ldrtl-',    # RTL drawable variants
+    'color-v31/',         # Dynamic color resources (Android 12+)
+    'drawable-v31/',      # Android 12+ specific drawables
+    'layout-v31/',        # Android 12+ specific layouts
+    'values-v31/',        # Android 12+ specific values
+    'mipmap-anydpi-v26/', # Adaptive icons that may cause issues
+))))
+
+# Characters that only appear in file names corrupted during decompilation
+BAD_NAME_CHARS = re.compile(r'[?:<>|"*]')
+
+# Projects listed per index page, newest first
+INDEX_PAGE_SIZE = 50
+
+# File type by lowercase extension; anything else is 'other' and not listed
+FILE_TYPES = {
+    'png': 'image',
+    'jpg': 'image',
+    'jpeg': 'image',
+    'webp': 'image',
+    'xml': 'xml',
+}
+
+# Static files of the Android Studio export scaffold, encoded once at import
+GRADLE_WRAPPER_PROPERTIES = """distributionBase=GRADLE_USER_HOME
 distributionPath=wrapper/dists
 distributionUrl=https\\://services.gradle.org/distributions/gradle-8.0-bin.zip
 zipStoreBase=GRADLE_USER_HOME
 zipStorePath=wrapper/dists
-"""
-                zip_ref.writestr('gradle/wrapper/gradle-wrapper.properties', gradle_wrapper_properties)
-                
-                # Add gradle wrapper jar (create empty placeholder)
-                zip_ref.writestr('gradle/wrapper/gradle-wrapper.jar', '')
-                
-                # Add gradle wrapper batch script
-                gradle_wrapper_bat = """@rem
+""".encode()
+
+GRADLEW_BAT = """@rem
 @rem Copyright 2015 the original author or authors.
 @rem
 @rem Licensed under the Apache License, Version 2.0 (the "License");
@@ -475,11 +187,9 @@ exit /b 1
 if "%OS%"=="Windows_NT" endlocal
 
 :omega
-"""
-                zip_ref.writestr('gradlew.bat', gradle_wrapper_bat)
-                
-                # Add gradle wrapper
-                gradle_wrapper_content = """#!/usr/bin/env sh
+""".encode()
+
+GRADLEW = """#!/usr/bin/env sh
 ##############################################################################
 ##
 ##  Gradle start up script for UN*X
@@ -645,200 +355,25 @@ APP_ARGS=$(save "$@")
 set -- $DEFAULT_JVM_OPTS $JAVA_OPTS $GRADLE_OPTS \\"-Dorg.gradle.appname=$APP_BASE_NAME\\" -classpath \\"$CLASSPATH\\" org.gradle.wrapper.GradleWrapperMain "$APP_ARGS"
 
 exec "$JAVACMD" "$@"
-"""
-                zip_ref.writestr('gradlew', gradle_wrapper_content)
-                
-                # Add build.gradle (app level)
-                app_build_gradle = f"""plugins {{
-    id 'com.android.application'
-}}
+""".encode()
 
-android {{
-    namespace '{project_name.lower().replace(" ", "_").replace("-", "_")}'
-    compileSdk 34
-
-    defaultConfig {{
-        applicationId "{project_name.lower().replace(" ", "_").replace("-", "_")}"
-        minSdk 21
-        targetSdk 34
-        versionCode 1
-        versionName "1.0"
-
-        testInstrumentationRunner "androidx.test.runner.AndroidJUnitRunner"
-    }}
-
-    buildTypes {{
-        release {{
-            minifyEnabled false
-            proguardFiles getDefaultProguardFile('proguard-android-optimize.txt'), 'proguard-rules.pro'
-        }}
-        debug {{
-            minifyEnabled false
-            debuggable true
-        }}
-    }}
-    
-    compileOptions {{
-        sourceCompatibility JavaVersion.VERSION_1_8
-        targetCompatibility JavaVersion.VERSION_1_8
-    }}
-    
-    // Handle resource conflicts and errors
-    packagingOptions {{
-        pickFirst '**/libc++_shared.so'
-        pickFirst '**/libjsc.so'
-        exclude 'META-INF/DEPENDENCIES'
-        exclude 'META-INF/LICENSE'
-        exclude 'META-INF/LICENSE.txt'
-        exclude 'META-INF/NOTICE'
-        exclude 'META-INF/NOTICE.txt'
-    }}
-    
-    // Ignore lint errors that might block compilation
-    lintOptions {{
-        abortOnError false
-        checkReleaseBuilds false
-        ignoreWarnings true
-    }}
-    
-    // Handle AAPT errors
-    aaptOptions {{
-        ignoreAssetsPattern "!.svn:!.git:!.ds_store:!*.scc:.*:!CVS:!thumbs.db:!picasa.ini:!*~"
-        cruncherEnabled false
-    }}
-}}
-
-dependencies {{
-    implementation 'androidx.appcompat:appcompat:1.6.1'
-    implementation 'com.google.android.material:material:1.10.0'
-    implementation 'androidx.constraintlayout:constraintlayout:2.1.4'
-    testImplementation 'junit:junit:4.13.2'
-    androidTestImplementation 'androidx.test.ext:junit:1.1.5'
-    androidTestImplementation 'androidx.test.espresso:espresso-core:3.5.1'
-}}"""
-                zip_ref.writestr('app/build.gradle', app_build_gradle)
-                
-                # Add settings.gradle
-                settings_gradle = f"""pluginManagement {{
-    repositories {{
-        google()
-        mavenCentral()
-        gradlePluginPortal()
-    }}
-}}
-dependencyResolutionManagement {{
-    repositoriesMode.set(RepositoriesMode.FAIL_ON_PROJECT_REPOS)
-    repositories {{
-        google()
-        mavenCentral()
-    }}
-}}
-
-rootProject.name = "{project_name}"
-include ':app'
-"""
-                zip_ref.writestr('settings.gradle', settings_gradle)
-                
-                # Add local.properties template
-                local_properties = """## This file must *NOT* be checked into Version Control Systems,
+LOCAL_PROPERTIES = """## This file must *NOT* be checked into Version Control Systems,
 # as it contains information specific to your local configuration.
 #
 # Location of the SDK. This is only used by Gradle.
 # For customization when using a Version Control System, please read the
 # header note.
-#sdk.dir=/path/to/android/sdk"""
-                zip_ref.writestr('local.properties', local_properties)
-                
-                # Add build.gradle (project level)
-                project_build_gradle = """plugins {
-    id 'com.android.application' version '8.1.4' apply false
-}"""
-                zip_ref.writestr('build.gradle', project_build_gradle)
-                
-                # Add gradle.properties
-                gradle_properties = """org.gradle.jvmargs=-Xmx2048m -Dfile.encoding=UTF-8
-android.useAndroidX=true
-android.enableJetifier=true"""
-                zip_ref.writestr('gradle.properties', gradle_properties)
-                
-                # Add basic MainActivity.java
-                main_activity_java = f"""package {project_name.lower().replace(" ", "_")};
-
-import android.app.Activity;
-import android.os.Bundle;
+#sdk.dir=/path/to/android/sdk""".encode()
 
-public class MainActivity extends Activity {{
-    @Override
-    protected void onCreate(Bundle savedInstanceState) {{
-        super.onCreate(savedInstanceState);
-        // TODO: Set content view and implement your logic here
-        // setContentView(R.layout.activity_main);
-    }}
-}}
-"""
-                zip_ref.writestr(f'app/src/main/java/{project_name.lower().replace(" ", "_")}/MainActivity.java', main_activity_java)
-                
-                # First, create a basic AndroidManifest.xml if none exists
-                manifest_content = f"""<?xml version="1.0" encoding="utf-8"?>
-<manifest xmlns:android="http://schemas.android.com/apk/res/android"
-    package="{project_name.lower().replace(' ', '_').replace('-', '_')}">
+PROJECT_BUILD_GRADLE = """plugins {
+    id 'com.android.application' version '8.1.4' apply false
+}""".encode()
 
-    <application
-        android:allowBackup="true"
-        android:icon="@mipmap/ic_launcher"
-        android:label="@string/app_name"
-        android:theme="@style/AppTheme">
-        <activity
-            android:name=".MainActivity"
-            android:exported="true">
-            <intent-filter>
-                <action android:name="android.intent.action.MAIN" />
-                <category android:name="android.intent.category.LAUNCHER" />
-            </intent-filter>
-        </activity>
-    </application>
+GRADLE_PROPERTIES = """org.gradle.jvmargs=-Xmx2048m -Dfile.encoding=UTF-8
+android.useAndroidX=true
+android.enableJetifier=true""".encode()
 
-</manifest>"""
-                zip_ref.writestr('app/src/main/AndroidManifest.xml', manifest_content)
-                
-                # Copy original APK files to app/src/main, filtering problematic files
-                manifest_copied = False
-                for root, dirs, files in os.walk(project_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arc_path = os.path.relpath(file_path, project_dir)
-                        
-                        # Skip problematic files that cause compilation issues
-                        if should_skip_file(arc_path):
-                            continue
-                        
-                        # Map APK structure to Android Studio structure
-                        if arc_path.startswith('res/'):
-                            new_path = f'app/src/main/{arc_path}'
-                        elif arc_path == 'AndroidManifest.xml' and not manifest_copied:
-                            # Try to use the original manifest, but validate it first
-                            try:
-                                with open(file_path, 'r', encoding='utf-8') as f:
-                                    original_manifest = f.read()
-                                # Only use original if it's valid XML
-                                if original_manifest.strip() and '<?xml' in original_manifest:
-                                    zip_ref.writestr('app/src/main/AndroidManifest.xml', original_manifest)
-                                    manifest_copied = True
-                                    continue
-                            except Exception:
-                                pass  # Use the default manifest we created above
-                            continue
-                        else:
-                            # Put other files in assets
-                            new_path = f'app/src/main/assets/{arc_path}'
-                        
-                        try:
-                            zip_ref.write(file_path, new_path)
-                        except Exception as e:
-                            logging.warning(f"Skipping file {arc_path}: {e}")
-                
-                # Create a basic layout if none exists
-                basic_layout = """<?xml version="1.0" encoding="utf-8"?>
+ACTIVITY_MAIN_XML = """<?xml version="1.0" encoding="utf-8"?>
 <LinearLayout xmlns:android="http://schemas.android.com/apk/res/android"
     android:layout_width="match_parent"
     android:layout_height="match_parent"
@@ -852,27 +387,16 @@ public class MainActivity extends Activity {{
         android:textSize="18sp" />
 
 </LinearLayout>
-"""
-                zip_ref.writestr('app/src/main/res/layout/activity_main.xml', basic_layout)
-                
-                # Create strings.xml
-                strings_xml = f"""<?xml version="1.0" encoding="utf-8"?>
-<resources>
-    <string name="app_name">{project_name}</string>
-</resources>"""
-                zip_ref.writestr('app/src/main/res/values/strings.xml', strings_xml)
-                
-                # Create styles.xml
-                styles_xml = """<?xml version="1.0" encoding="utf-8"?>
+""".encode()
+
+STYLES_XML = """<?xml version="1.0" encoding="utf-8"?>
 <resources>
     <style name="AppTheme" parent="Theme.AppCompat.Light.DarkActionBar">
         <!-- Customize your theme here. -->
     </style>
-</resources>"""
-                zip_ref.writestr('app/src/main/res/values/styles.xml', styles_xml)
-                
-                # Add proguard-rules.pro
-                proguard_rules = """# Add project specific ProGuard rules here.
+</resources>""".encode()
+
+PROGUARD_RULES = """# Add project specific ProGuard rules here.
 # You can control the set of applied configuration files using the
 # proguardFiles setting in build.gradle.
 #
@@ -892,12 +416,10 @@ public class MainActivity extends Activity {{
 
 # If you keep the line number information, uncomment this to
 # hide the original source file name.
-#-renamesourcefileattribute SourceFile"""
-                zip_ref.writestr('app/proguard-rules.pro', proguard_rules)
-                
-                # Add README
-                readme_content = f"""# {project_name} - Android Studio Project
+#-renamesourcefileattribute SourceFile""".encode()
 
+# Everything in the export README after its "# <project name>" title line
+README_BODY = """
 This project was exported from APK Editor and can be imported into Android Studio.
 
 ## Import Instructions:
@@ -1004,13 +526,961 @@ If you encounter "Multiple task action failures occurred", try these solutions:
 - Start with a minimal AndroidManifest.xml and add permissions as needed
 - Test build frequently when adding back filtered resources
 - Consider creating a new project and copying resources gradually if issues persist
+""".encode()
+
+@functools.lru_cache(maxsize=64)
+def render_export_scaffold(project_name):
+    """Generated Android Studio files as (head, tail) tuples of (arcname, bytes)
+    
+    head is written before the copied APK files so an original manifest follows the
+    default one; tail is written after them.
+    """
+    package = project_name.lower().replace(' ', '_').replace('-', '_')
+    java_package = project_name.lower().replace(' ', '_')
+    
+    # build.gradle (app level)
+    app_build_gradle = f"""plugins {{
+    id 'com.android.application'
+}}
+
+android {{
+    namespace '{package}'
+    compileSdk 34
+
+    defaultConfig {{
+        applicationId "{package}"
+        minSdk 21
+        targetSdk 34
+        versionCode 1
+        versionName "1.0"
+
+        testInstrumentationRunner "androidx.test.runner.AndroidJUnitRunner"
+    }}
+
+    buildTypes {{
+        release {{
+            minifyEnabled false
+            proguardFiles getDefaultProguardFile('proguard-android-optimize.txt'), 'proguard-rules.pro'
+        }}
+        debug {{
+            minifyEnabled false
+            debuggable true
+        }}
+    }}
+    
+    compileOptions {{
+        sourceCompatibility JavaVersion.VERSION_1_8
+        targetCompatibility JavaVersion.VERSION_1_8
+    }}
+    
+    // Handle resource conflicts and errors
+    packagingOptions {{
+        pickFirst '**/libc++_shared.so'
+        pickFirst '**/libjsc.so'
+        exclude 'META-INF/DEPENDENCIES'
+        exclude 'META-INF/LICENSE'
+        exclude 'META-INF/LICENSE.txt'
+        exclude 'META-INF/NOTICE'
+        exclude 'META-INF/NOTICE.txt'
+    }}
+    
+    // Ignore lint errors that might block compilation
+    lintOptions {{
+        abortOnError false
+        checkReleaseBuilds false
+        ignoreWarnings true
+    }}
+    
+    // Handle AAPT errors
+    aaptOptions {{
+        ignoreAssetsPattern "!.svn:!.git:!.ds_store:!*.scc:.*:!CVS:!thumbs.db:!picasa.ini:!*~"
+        cruncherEnabled false
+    }}
+}}
+
+dependencies {{
+    implementation 'androidx.appcompat:appcompat:1.6.1'
+    implementation 'com.google.android.material:material:1.10.0'
+    implementation 'androidx.constraintlayout:constraintlayout:2.1.4'
+    testImplementation 'junit:junit:4.13.2'
+    androidTestImplementation 'androidx.test.ext:junit:1.1.5'
+    androidTestImplementation 'androidx.test.espresso:espresso-core:3.5.1'
+}}"""
+    
+    settings_gradle = f"""pluginManagement {{
+    repositories {{
+        google()
+        mavenCentral()
+        gradlePluginPortal()
+    }}
+}}
+dependencyResolutionManagement {{
+    repositoriesMode.set(RepositoriesMode.FAIL_ON_PROJECT_REPOS)
+    repositories {{
+        google()
+        mavenCentral()
+    }}
+}}
+
+rootProject.name = "{project_name}"
+include ':app'
 """
-                zip_ref.writestr('README.md', readme_content)
-            
-            return True
-            
-        except Exception as e:
-            logging.error(f"Error creating Android Studio export: {e}")
+    
+    # Basic MainActivity.java
+    main_activity_java = f"""package {java_package};
+
+import android.app.Activity;
+import android.os.Bundle;
+
+public class MainActivity extends Activity {{
+    @Override
+    protected void onCreate(Bundle savedInstanceState) {{
+        super.onCreate(savedInstanceState);
+        // TODO: Set content view and implement your logic here
+        // setContentView(R.layout.activity_main);
+    }}
+}}
+"""
+    
+    # Basic AndroidManifest.xml, used when the APK has no readable one
+    manifest_content = f"""<?xml version="1.0" encoding="utf-8"?>
+<manifest xmlns:android="http://schemas.android.com/apk/res/android"
+    package="{package}">
+
+    <application
+        android:allowBackup="true"
+        android:icon="@mipmap/ic_launcher"
+        android:label="@string/app_name"
+        android:theme="@style/AppTheme">
+        <activity
+            android:name=".MainActivity"
+            android:exported="true">
+            <intent-filter>
+                <action android:name="android.intent.action.MAIN" />
+                <category android:name="android.intent.category.LAUNCHER" />
+            </intent-filter>
+        </activity>
+    </application>
+
+</manifest>"""
+    
+    strings_xml = f"""<?xml version="1.0" encoding="utf-8"?>
+<resources>
+    <string name="app_name">{project_name}</string>
+</resources>"""
+    
+    readme_content = f"# {project_name} - Android Studio Project\n".encode() + README_BODY
+    
+    head = (
+        ('gradle/wrapper/gradle-wrapper.properties', GRADLE_WRAPPER_PROPERTIES),
+        ('gradle/wrapper/gradle-wrapper.jar', b''),  # empty placeholder
+        ('gradlew.bat', GRADLEW_BAT),
+        ('gradlew', GRADLEW),
+        ('app/build.gradle', app_build_gradle.encode()),
+        ('settings.gradle', settings_gradle.encode()),
+        ('local.properties', LOCAL_PROPERTIES),
+        ('build.gradle', PROJECT_BUILD_GRADLE),
+        ('gradle.properties', GRADLE_PROPERTIES),
+        (f'app/src/main/java/{java_package}/MainActivity.java', main_activity_java.encode()),
+        ('app/src/main/AndroidManifest.xml', manifest_content.encode()),
+    )
+    tail = (
+        ('app/src/main/res/layout/activity_main.xml', ACTIVITY_MAIN_XML),
+        ('app/src/main/res/values/strings.xml', strings_xml.encode()),
+        ('app/src/main/res/values/styles.xml', STYLES_XML),
+        ('app/proguard-rules.pro', PROGUARD_RULES),
+        ('README.md', readme_content),
+    )
+    return head, tail
+
+class Project(db.Model):
+    """Database model for APK projects"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    original_filename = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(50), default='uploaded')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    path = db.Column(db.String(500))
+    
+    __table_args__ = (
+        db.Index('ix_project_created_at_desc', created_at.desc()),
+    )
+
+def init_db():
+    """Create missing tables and indexes"""
+    # One connection and one transaction for every existence check and CREATE
+    with db.engine.begin() as conn:
+        db.metadata.create_all(conn)
+        # create_all() skips indexes on tables that already exist
+        for index in Project.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+class UploadRequest(Request):
+    """Request that spools uploaded files straight into the upload folder"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        # A named temp file next to the final path can be hard-linked into place
+        return tempfile.NamedTemporaryFile('wb+', dir=current_app.config['UPLOAD_FOLDER'],
+                                           prefix='.upload-')
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent reads and cheap commits"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA cache_size=-64000')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.close()
+
+def create_app():
+    """Application factory"""
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+    
+    # Configuration
+    app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///apk_editor.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Keep warm connections for request threads plus the background job pool
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 10, 'max_overflow': 20}
+    app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    # Let the front-end server stream downloads: X-Sendfile (Apache/lighttpd) or
+    # X-Accel-Redirect to an nginx `internal` location aliasing the temp folder
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+    app.config['X_ACCEL_TEMP_PREFIX'] = os.environ.get('X_ACCEL_TEMP_PREFIX')
+    
+    # Initialize extensions
+    db.init_app(app)
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_sqlite_pragmas)
+    
+    # Setup logging
+    logging.basicConfig(level=logging.INFO)
+    
+    # Create directories
+    for folder in ('uploads', 'projects', 'temp', 'static', 'templates'):
+        if not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+    
+    # Create the signing keystore now rather than during the first compile
+    if apk_editor.apktool_path and apk_editor.java_path:
+        apk_editor.ensure_debug_keystore()
+    
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Creates the database tables."""
+        init_db()
+        print("Initialized the database.")
+    
+    @app.route('/')
+    def index():
+        """Main page"""
+        page = max(request.args.get('page', 1, type=int), 1)
+        # One extra row tells whether an older page exists
+        projects = db.session.execute(
+            select(Project.id, Project.name, Project.original_filename, Project.created_at)
+            .order_by(Project.created_at.desc())
+            .limit(INDEX_PAGE_SIZE + 1).offset((page - 1) * INDEX_PAGE_SIZE)
+        ).all()
+        has_more = len(projects) > INDEX_PAGE_SIZE
+        return render_template('index.html', projects=projects[:INDEX_PAGE_SIZE],
+                               page=page, has_more=has_more)
+    
+    @app.route('/upload', methods=['GET', 'POST'])
+    def upload_apk():
+        """Upload APK file"""
+        if request.method == 'POST':
+            if 'apk_file' not in request.files:
+                return upload_error('No file selected', redirect(request.url))
+            
+            file = request.files['apk_file']
+            project_name = request.form.get('project_name', '').strip()
+            
+            if file.filename == '':
+                return upload_error('No file selected', redirect(request.url))
+            
+            if not project_name:
+                project_name = os.path.splitext(file.filename)[0]
+            
+            if file and file.filename.lower().endswith('.apk'):
+                if not has_zip_magic(file.stream):
+                    return upload_error('File is not a valid APK archive')
+                
+                try:
+                    # Create project; flushing assigns the id its upload is stored under
+                    filename = secure_filename(file.filename)
+                    project = Project(
+                        name=project_name,
+                        original_filename=filename,
+                        status='uploaded'
+                    )
+                    db.session.add(project)
+                    db.session.flush()
+                    
+                    # Save uploaded file
+                    upload_path = get_upload_path(project.id)
+                    save_upload(file.stream, upload_path)
+                    project.path = upload_path
+                    db.session.commit()
+                    
+                    flash(f'APK uploaded successfully: {project_name}', 'success')
+                    project_url = url_for('project_detail', project_id=project.id)
+                    if wants_json():
+                        # Script uploads navigate themselves; skip the redirect round-trip
+                        return jsonify(project_id=project.id, url=project_url), 201
+                    return redirect(project_url)
+                    
+                except Exception as e:
+                    db.session.rollback()
+                    return upload_error(f'Error uploading file: {str(e)}')
+            else:
+                return upload_error('Please select a valid APK file')
+        
+        return render_template('upload.html')
+    
+    @app.route('/project/<int:project_id>')
+    def project_detail(project_id):
+        """Project detail page"""
+        project = db.get_or_404(Project, project_id)
+        
+        # Get project directory structure if decompiled
+        project_dir = get_project_dir(project_id)
+        dir_stat = stat_safe(project_dir)
+        files = list_project_files(project_dir, dir_stat.st_mtime_ns) if dir_stat else ()
+        
+        running = collect_job(project)
+        export_ready = not running and stat_safe(get_export_path(project)) is not None
+        return render_template('project_detail.html', project=project, files=files,
+                               job_running=running, export_ready=export_ready)
+    
+    @app.route('/decompile/<int:project_id>')
+    def decompile_apk(project_id):
+        """Decompile APK"""
+        project = db.get_or_404(Project, project_id)
+        return submit_job(project, 'decompiling', decompile_job, 'Decompiling APK...')
+    
+    @app.route('/compile/<int:project_id>')
+    def compile_apk(project_id):
+        """Compile APK"""
+        project = db.get_or_404(Project, project_id)
+        return submit_job(project, 'compiling', compile_job, 'Compiling APK...')
+    
+    @app.route('/job/<int:project_id>/status')
+    def job_status(project_id):
+        """Report the state of a project's background job"""
+        future = jobs.get(project_id)
+        error = None
+        
+        if future is None:
+            state = 'none'
+        elif not future.done():
+            state = 'running'
+        elif future.exception() is not None:
+            state = 'failed'
+            error = str(future.exception())
+        else:
+            state = 'done'
+        
+        # Load after checking the job so a finished job's status is already committed
+        project = db.get_or_404(Project, project_id)
+        return jsonify(state=state, status=project.status, error=error)
+    
+    @app.route('/download/<int:project_id>')
+    def download_apk(project_id):
+        """Download compiled APK"""
+        project = db.get_or_404(Project, project_id)
+        
+        if project.status != 'compiled' or stat_safe(project.path) is None:
+            flash('APK not ready for download. Please compile first.', 'error')
+            return redirect(url_for('project_detail', project_id=project_id))
+        
+        return send_download(project.path, f'{project.name}_modified.apk')
+    
+    @app.route('/export_android_studio/<int:project_id>')
+    def export_android_studio(project_id):
+        """Export project for Android Studio"""
+        project = db.get_or_404(Project, project_id)
+        project_dir = get_project_dir(project_id)
+        
+        if not os.path.exists(project_dir):
+            flash('Project not decompiled yet. Please decompile first.', 'error')
+            return redirect(url_for('project_detail', project_id=project_id))
+        
+        compression = EXPORT_COMPRESSION.get(request.args.get('compression'), zipfile.ZIP_DEFLATED)
+        return submit_job(project, None, functools.partial(export_job, compression=compression),
+                          'Building Android Studio export...')
+    
+    @app.route('/export_android_studio/<int:project_id>/download')
+    def download_export(project_id):
+        """Download a finished Android Studio export"""
+        project = db.get_or_404(Project, project_id)
+        export_path = get_export_path(project)
+        
+        if job_running(project_id) or stat_safe(export_path) is None:
+            flash('Export not ready. Please export the project first.', 'error')
+            return redirect(url_for('project_detail', project_id=project_id))
+        
+        return send_download(export_path, f'{project.name}_android_studio.zip')
+    
+    @app.route('/edit_file/<int:project_id>/<path:file_path>')
+    def edit_file(project_id, file_path):
+        """Edit file in project"""
+        project = db.get_or_404(Project, project_id)
+        project_dir = get_project_dir(project_id)
+        full_path = os.path.join(project_dir, file_path)
+        
+        if not os.path.exists(full_path):
+            flash('File not found', 'error')
+            return redirect(url_for('project_detail', project_id=project_id))
+        
+        file_type = get_file_type(file_path)
+        content = None
+        
+        if file_type == 'xml':
+            with open(full_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    content = ''
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        if mm[:4] == AXML_MAGIC:
+                            flash('This is a binary XML file. Decompile with APKTool to edit it.', 'error')
+                            return redirect(url_for('project_detail', project_id=project_id))
+                        # Decode straight from the mapping: one pass, no intermediate copy
+                        try:
+                            content = str(mm, 'utf-8')
+                        except UnicodeDecodeError:
+                            content = str(mm, 'latin-1')
+        
+        return render_template('edit_file.html', project=project, 
+                             file_path=file_path, file_type=file_type, content=content)
+    
+    @app.route('/save_file/<int:project_id>/<path:file_path>', methods=['POST'])
+    def save_file(project_id, file_path):
+        """Save edited file"""
+        project = db.get_or_404(Project, project_id)
+        project_dir = get_project_dir(project_id)
+        full_path = os.path.join(project_dir, file_path)
+        
+        content = request.form.get('content', '')
+        
+        # Write a sibling temp file and rename it over the original, so a crash
+        # mid-write never leaves a truncated resource behind
+        tmp_path = full_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, full_path)
+            flash('File saved successfully', 'success')
+        except Exception as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            flash(f'Error saving file: {str(e)}', 'error')
+        
+        return redirect(url_for('project_detail', project_id=project_id))
+    
+    @app.route('/delete_project/<int:project_id>')
+    def delete_project(project_id):
+        """Delete project"""
+        project = db.get_or_404(Project, project_id)
+        
+        if job_running(project_id):
+            flash('Cannot delete a project while a job is running', 'error')
+            return redirect(url_for('project_detail', project_id=project_id))
+        
+        try:
+            # Delete project files: rename out of the way so a reused project id
+            # never sees stale files, then unlink the tree off the request thread
+            project_dir = get_project_dir(project_id)
+            trash_dir = f'{project_dir}.deleted-{uuid.uuid4().hex}'
+            try:
+                os.rename(project_dir, trash_dir)
+                list_project_files.cache_clear()
+                job_executor.submit(discard_tree, trash_dir)
+            except FileNotFoundError:
+                pass
+            
+            for path in (project.path, get_upload_path(project_id), get_export_path(project)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            
+            # Delete from database
+            db.session.delete(project)
+            db.session.commit()
+            jobs.pop(project_id, None)
+            
+            flash('Project deleted successfully', 'success')
+        except Exception as e:
+            flash(f'Error deleting project: {str(e)}', 'error')
+        
+        return redirect(url_for('index'))
+    
+    @app.errorhandler(413)
+    def too_large(e):
+        if wants_json():
+            return jsonify(error='File too large. Maximum size is 100MB.'), 413
+        flash('File too large. Maximum size is 100MB.', 'error')
+        return redirect(url_for('upload_apk'))
+    
+    def wants_json():
+        """Check whether the client asked for a JSON response"""
+        return (request.accept_mimetypes.best == 'application/json' or
+                request.headers.get('X-Requested-With') == 'XMLHttpRequest')
+    
+    def upload_error(message, response=None):
+        """Report an upload error as JSON or as a flash message on the upload page"""
+        if wants_json():
+            return jsonify(error=message), 400
+        flash(message, 'error')
+        return response if response is not None else render_template('upload.html')
+    
+    def job_running(project_id):
+        """Check whether a background job is in flight for a project"""
+        future = jobs.get(project_id)
+        return future is not None and not future.done()
+    
+    def submit_job(project, running_status, work, message):
+        """Start a background job and answer with 202 + status URL or a redirect
+        
+        running_status is stored on the project while the job runs; None leaves it alone.
+        """
+        with jobs_lock:
+            started = not job_running(project.id)
+            if started:
+                previous_status = project.status
+                if running_status is not None:
+                    project.status = running_status
+                    db.session.commit()
+                jobs[project.id] = job_executor.submit(run_job, project.id, previous_status, work)
+        
+        if not started:
+            if wants_json():
+                return jsonify(error='A job is already running for this project'), 409
+            flash('A job is already running for this project', 'error')
+        elif wants_json():
+            return jsonify(job_id=project.id,
+                           status_url=url_for('job_status', project_id=project.id)), 202
+        else:
+            flash(message, 'info')
+        
+        return redirect(url_for('project_detail', project_id=project.id))
+    
+    def run_job(project_id, previous_status, work):
+        """Run work(project) in its own app context and persist the outcome"""
+        with app.app_context():
+            project = db.session.get(Project, project_id)
+            try:
+                message = work(project)
+            except Exception:
+                project.status = previous_status
+                db.session.commit()
+                raise
+            db.session.commit()
+            return message
+    
+    def collect_job(project):
+        """Flash the result of a finished job; returns True while one is still running"""
+        with jobs_lock:
+            future = jobs.get(project.id)
+            if future is None:
+                # A job status with no job behind it means the process restarted mid-job
+                if project.status in JOB_STATUSES:
+                    project.status = JOB_STATUSES[project.status]
+                    db.session.commit()
+                return False
+            if not future.done():
+                return True
+            del jobs[project.id]
+        
+        db.session.refresh(project)
+        if future.exception() is not None:
+            flash(str(future.exception()), 'error')
+        else:
+            flash(future.result(), 'success')
+        return False
+    
+    def decompile_job(project):
+        """Background body of decompile_apk"""
+        project_dir = get_project_dir(project.id)
+        try:
+            success = apk_editor.decompile_apk(project.path, project_dir)
+        except Exception as e:
+            raise RuntimeError(f'Error decompiling APK: {str(e)}') from e
+        
+        if not success:
+            raise RuntimeError('Failed to decompile APK')
+        list_project_files.cache_clear()
+        project.status = 'decompiled'
+        return 'APK decompiled successfully'
+    
+    def compile_job(project):
+        """Background body of compile_apk"""
+        project_dir = get_project_dir(project.id)
+        output_path = get_output_path(project)
+        original_apk = get_upload_path(project.id)
+        try:
+            success = apk_editor.compile_apk(project_dir, output_path, original_apk)
+        except Exception as e:
+            raise RuntimeError(f'Error compiling APK: {str(e)}') from e
+        
+        if not success:
+            raise RuntimeError('Failed to compile APK')
+        project.status = 'compiled'
+        project.path = output_path
+        return 'APK compiled successfully'
+    
+    def export_job(project, compression=zipfile.ZIP_DEFLATED):
+        """Background body of export_android_studio"""
+        project_dir = get_project_dir(project.id)
+        export_path = get_export_path(project)
+        # Build beside the final path so a failed or interrupted export is never served
+        build_path = f'{export_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            success = create_android_studio_export(project_dir, build_path, project.name,
+                                                   compression)
+            if success:
+                os.replace(build_path, export_path)
+        except Exception as e:
+            raise RuntimeError(f'Error creating export: {str(e)}') from e
+        finally:
+            try:
+                os.remove(build_path)
+            except FileNotFoundError:
+                pass
+        
+        if not success:
+            raise RuntimeError('Failed to create Android Studio export')
+        return 'Android Studio export ready for download'
+    
+    def get_project_dir(project_id):
+        """Location of a project's decompiled tree"""
+        return os.path.join('projects', f'project_{project_id}')
+    
+    def get_upload_path(project_id):
+        """Location of a project's uploaded APK, unique per project"""
+        return os.path.join(app.config['UPLOAD_FOLDER'], f'project_{project_id}.apk')
+    
+    def get_output_path(project):
+        """Location of a project's compiled APK"""
+        return os.path.join('temp', f'project_{project.id}_modified.apk')
+    
+    def get_export_path(project):
+        """Location of a project's Android Studio export ZIP"""
+        return os.path.join('temp', f'project_{project.id}_android_studio.zip')
+    
+    @functools.lru_cache(maxsize=128)
+    def list_project_files(project_dir, mtime_ns):
+        """Editable files of a decompiled project, cached until the tree is rebuilt"""
+        files = []
+        try:
+            for entry in iter_files(project_dir):
+                file_type = get_file_type(entry.name)
+                if file_type != 'other':
+                    files.append({
+                        'name': entry.name,
+                        'path': os.path.relpath(entry.path, project_dir),
+                        'type': file_type
+                    })
+        except FileNotFoundError:
+            pass  # Removed while listing
+        return tuple(files)
+    
+    def discard_tree(path):
+        """Background removal of a deleted project's files"""
+        try:
+            remove_tree(path)
+        except Exception as e:
+            logging.error(f"Error removing {path}: {e}")
+    
+    def send_download(path, download_name):
+        """Send a file from the temp folder, offloaded to nginx when configured"""
+        prefix = app.config['X_ACCEL_TEMP_PREFIX']
+        if not prefix:
+            return send_file(os.path.abspath(path), as_attachment=True,
+                             download_name=download_name)
+        
+        # nginx reads the file itself from its internal location; send headers only
+        response = app.response_class(mimetype='application/octet-stream')
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        response.headers['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{quote(os.path.basename(path))}"
+        return response
+    
+    def get_file_type(filename):
+        """Get file type based on extension"""
+        _, dot, ext = filename.rpartition('.')
+        return FILE_TYPES.get(ext.lower(), 'other') if dot else 'other'
+    
+    def has_zip_magic(stream):
+        """Check the upload starts like a ZIP archive, leaving the stream rewound"""
+        header = stream.read(len(ZIP_MAGIC))
+        stream.seek(0)
+        return header == ZIP_MAGIC
+    
+    def save_upload(stream, upload_path):
+        """Write an uploaded file stream to disk in 1 MiB chunks"""
+        spool_path = getattr(stream, 'name', None)
+        if isinstance(spool_path, str):
+            # Spooled by UploadRequest on the same filesystem; link it instead of copying
+            try:
+                if os.path.exists(upload_path):
+                    os.remove(upload_path)
+                os.link(spool_path, upload_path)
+                return
+            except OSError:
+                pass
+        
+        with open(upload_path, 'wb', buffering=COPY_BUFFER_SIZE) as dst:
+            src_fd = None
+            if hasattr(os, 'sendfile'):
+                try:
+                    src_fd = stream.fileno()
+                except (AttributeError, OSError):
+                    pass
+            
+            if src_fd is not None:
+                # Large uploads are spooled to a real temp file; let the kernel copy it
+                offset = stream.tell()
+                try:
+                    while True:
+                        sent = os.sendfile(dst.fileno(), src_fd, offset, COPY_BUFFER_SIZE)
+                        if not sent:
+                            return
+                        offset += sent
+                except OSError:
+                    stream.seek(offset)
+            
+            shutil.copyfileobj(stream, dst, COPY_BUFFER_SIZE)
+    
+    def should_skip_file(file_path, st):
+        """Check if file should be skipped during Android Studio export; st is its os.stat()"""
+        # Skip problematic 9-patch files that often cause compilation errors
+        if file_path.endswith('.9.png'):
+            return True
+        
+        # Skip binary resource files that may be corrupted
+        if file_path.endswith('.arsc'):
+            return True
+        
+        # Skip dex files (compiled Java bytecode)
+        if file_path.endswith('.dex'):
+            return True
+        
+        # Skip binary kotlin files
+        if file_path.endswith('.kotlin_builtins'):
+            return True
+        
+        # Skip META-INF signing files
+        if 'META-INF/' in file_path and (
+            file_path.endswith('.RSA') or 
+            file_path.endswith('.SF') or 
+            file_path.endswith('.MF')
+        ):
+            return True
+        
+        # Skip certain resource directories that cause issues
+        if PROBLEMATIC_RES_DIRS.search(file_path):
+            return True
+        
+        # Skip files with problematic names (corrupted during decompilation)
+        if BAD_NAME_CHARS.search(os.path.basename(file_path)):
+            return True
+        
+        # Skip very large files that might cause memory issues
+        if st.st_size > 50 * 1024 * 1024:  # 50MB
+            return True
+        
+        # Validate XML files to prevent prolog errors
+        if file_path.endswith('.xml') and not xml_is_valid(file_path, st.st_mtime_ns, st.st_size):
+            return True
+        
+        return False
+    
+    @functools.lru_cache(maxsize=8192)
+    def xml_is_valid(path, mtime_ns, size):
+        """Whether a file parses as XML; keyed on mtime and size so edits are re-checked"""
+        parser = ET.XMLParser()
+        try:
+            # Feed in chunks so large resources never sit in memory whole
+            with open(path, 'rb') as f:
+                while chunk := f.read(COPY_BUFFER_SIZE):
+                    parser.feed(chunk)
+            # Empty and whitespace-only files fail here with "no element found"
+            parser.close()
+        except (ET.ParseError, OSError):
+            return False
+        return True
+    
+    # Scaffold bytes objects are shared across exports, so their deflated form is too
+    deflate_scaffold_file = functools.lru_cache(maxsize=256)(deflate_bytes)
+    
+    def write_scaffold(zip_ref, files):
+        """Write generated (arcname, bytes) files, reusing cached DEFLATE output"""
+        # Same header fields writestr() would produce, with one localtime() per batch
+        date_time = time.localtime()[:6]
+        for arcname, data in files:
+            zinfo = zipfile.ZipInfo(arcname, date_time)
+            zinfo.external_attr = 0o600 << 16
+            if zip_ref.compression != zipfile.ZIP_DEFLATED:
+                zip_ref.writestr(zinfo, data, compress_type=zip_ref.compression,
+                                 compresslevel=zip_ref.compresslevel)
+                continue
+            crc, size, compressed = deflate_scaffold_file(data, zip_ref.compresslevel)
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            zinfo.CRC = crc
+            zinfo.file_size = size
+            zinfo.compress_size = len(compressed)
+            write_precompressed(zip_ref, zinfo, compressed)
+    
+    def read_small_file(path, arcname, st):
+        """ZipInfo for path plus its contents, or None as contents above SMALL_FILE_LIMIT"""
+        zinfo = zipinfo_from_stat(st, arcname)
+        if zinfo.file_size > SMALL_FILE_LIMIT:
+            return zinfo, None
+        with open(path, 'rb') as f:
+            return zinfo, f.read()
+    
+    def read_ahead(entries, deflated):
+        """Yield (entry, read future) with small files opened and read on a thread pool"""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=EXPORT_READ_WORKERS) as reader:
+            window = collections.deque()
+            for entry in entries:
+                file_path, _, new_path, _, st = entry
+                read = None if file_path in deflated else reader.submit(read_small_file, file_path,
+                                                                        new_path, st)
+                window.append((entry, read))
+                if len(window) >= EXPORT_READ_AHEAD:
+                    yield window.popleft()
+            while window:
+                yield window.popleft()
+    
+    def write_streamed(zip_ref, path, zinfo, compress_type):
+        """Copy path into the archive in COPY_BUFFER_SIZE chunks; write() reads 8 KiB at a time"""
+        zinfo.compress_type = compress_type
+        zinfo._compresslevel = zip_ref.compresslevel
+        # zinfo.file_size comes from stat, so open() picks ZIP64 headers up front when needed
+        with open(path, 'rb', buffering=0) as src, zip_ref.open(zinfo, 'w') as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+    
+    def create_android_studio_export(project_dir, export_path, project_name,
+                                     compression=zipfile.ZIP_DEFLATED):
+        """Create Android Studio compatible project export"""
+        try:
+            # Generated files are all text: compress them (deflate at the fastest level)
+            # Buffered so each entry's header and small payloads don't cost a write() apiece
+            with open_buffered_writer(export_path) as out, \
+                    zipfile.ZipFile(out, 'w', compression, compresslevel=1) as zip_ref:
+                # Scaffold files, rendered once per project name
+                head, tail = render_export_scaffold(project_name)
+                write_scaffold(zip_ref, head)
+                
+                # Copy original APK files to app/src/main, filtering problematic files
+                manifest_copied = False
+                entries = []
+                for entry in iter_files(project_dir):
+                    file_path = entry.path
+                    arc_path = os.path.relpath(file_path, project_dir)
+                    # One stat per file, shared by the skip checks and the ZIP header
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    
+                    # Skip problematic files that cause compilation issues
+                    if should_skip_file(file_path, st):
+                        continue
+                    
+                    # Map APK structure to Android Studio structure
+                    if arc_path.startswith('res/'):
+                        new_path = f'app/src/main/{arc_path}'
+                    elif arc_path == 'AndroidManifest.xml' and not manifest_copied:
+                        # Try to use the original manifest, but validate it first
+                        try:
+                            # Probe through a read-only mapping; the copy below streams
+                            with open(file_path, 'rb') as f, \
+                                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                                is_text_xml = mm.find(b'<?xml') != -1
+                            # Only use original if it's valid XML
+                            if is_text_xml:
+                                write_streamed(zip_ref, file_path,
+                                               zipinfo_from_stat(st, 'app/src/main/AndroidManifest.xml'),
+                                               compression)
+                                manifest_copied = True
+                                continue
+                        except Exception:
+                            pass  # Use the default manifest we created above
+                        continue
+                    else:
+                        # Put other files in assets
+                        new_path = f'app/src/main/assets/{arc_path}'
+                    
+                    # Copied APK content is mostly already compressed; only deflate text
+                    if new_path.endswith(EXPORT_TEXT_SUFFIXES):
+                        compress_type = compression
+                    else:
+                        compress_type = zipfile.ZIP_STORED
+                    entries.append((file_path, arc_path, new_path, compress_type, st))
+                
+                # Deflate text files in worker processes; the archive itself is written here
+                deflated = {}
+                text_files = [e[0] for e in entries if e[3] == zipfile.ZIP_DEFLATED]
+                if len(text_files) > PARALLEL_DEFLATE_THRESHOLD:
+                    try:
+                        pool = deflate_pool()
+                        deflated = {path: pool.submit(deflate_file, path, 1) for path in text_files}
+                    except BrokenProcessPool:
+                        # A worker died in an earlier export; the next one gets a fresh pool
+                        deflate_pool.cache_clear()
+                        deflated = {}
+                
+                skipped = []
+                for (file_path, arc_path, new_path, compress_type, st), read in read_ahead(entries, deflated):
+                    try:
+                        future = deflated.get(file_path)
+                        if future is None:
+                            zinfo, data = read.result()
+                            if data is None:
+                                write_streamed(zip_ref, file_path, zinfo, compress_type)
+                            else:
+                                zip_ref.writestr(zinfo, data, compress_type=compress_type,
+                                                 compresslevel=zip_ref.compresslevel)
+                        else:
+                            try:
+                                crc, size, data = future.result()
+                            except BrokenProcessPool:
+                                # A worker died mid-export; finish the remaining files here
+                                deflate_pool.cache_clear()
+                                crc, size, data = deflate_file(file_path, 1)
+                            zinfo = zipinfo_from_stat(st, new_path)
+                            zinfo.compress_type = zipfile.ZIP_DEFLATED
+                            zinfo.CRC = crc
+                            zinfo.file_size = size
+                            zinfo.compress_size = len(data)
+                            write_precompressed(zip_ref, zinfo, data)
+                    except Exception as e:
+                        skipped.append((arc_path, e))
+                
+                # One log record for the whole export instead of one per failed file
+                if skipped:
+                    logging.warning("Skipped %d files: %s", len(skipped),
+                                    '; '.join(f'{path} ({e})' for path, e in skipped))
+                
+                # Default layout, strings, styles, proguard rules and README
+                write_scaffold(zip_ref, tail)
+            
+            return True
+            
+        except Exception:
+            # Export failures are rare and hard to reproduce; keep the traceback
+            logging.exception("Error creating Android Studio export")
             return False
     
     return app
\ No newline at end of file
@@ -6,7 +6,7 @@ A web-based APK editor for modifying Android applications
 
 import os
 import sys
-from app import create_app, db
+from app import create_app, init_db
 
 def main():
     """Main application entry point"""
@@ -22,15 +22,19 @@ def main():
     app = create_app()
 
     with app.app_context():
-        db.create_all()
+        init_db()
 
-    # Run the application
+    # Run the application; the debugger is opt-in via APK_EDITOR_DEBUG=1.
+    # For production, serve create_app() from a WSGI server instead. Keep a single
+    # worker process, since background jobs are tracked in memory, e.g.
+    #   gunicorn --worker-class=gthread -w 1 --threads 8 -b 0.0.0.0:5001 "app:create_app()"
     try:
         app.run(
             host='0.0.0.0',
             port=5001,
-            debug=True,
-            use_reloader=False  # Disable reloader to prevent double startup
+            debug=os.environ.get('APK_EDITOR_DEBUG') == '1',
+            use_reloader=False,  # Disable reloader to prevent double startup
+            threaded=True
         )
     except KeyboardInterrupt:
         print("\nShutting down server...")